@@ -7,17 +7,25 @@ through AnkiConnect. It supports resources (decks, models, notes) and tools
 for creating, updating, and managing Anki content.
 """
 
+import asyncio
+import http.client
+import io
 import json
+import re
+import select
 import sys
 import logging
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
 try:
-    import requests
+    import orjson
 except ImportError:
-    requests = None
-import urllib.request
-import urllib.error
+    orjson = None
 
 
 # Configure logging to stderr only
@@ -28,11 +36,133 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ANKI_CONNECT_HOST = "localhost"
+ANKI_CONNECT_PORT = 8765
+ANKI_CONNECT_URL = f"http://{ANKI_CONNECT_HOST}:{ANKI_CONNECT_PORT}"
+
+# JSON helpers: use orjson when it is installed, otherwise the stdlib.
+# _dumpb returns bytes (wire format), _dumps_pretty returns indented str.
+if orjson is not None:
+    _loads = orjson.loads
+    _dumpb = orjson.dumps
+    
+    def _dumps_pretty(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+else:
+    # One decoder instance reused for every message. Input is always UTF-8
+    # (AnkiConnect bodies, MCP stdio), so bytes are decoded directly instead
+    # of going through json.loads' encoding detection.
+    _DECODER = json.JSONDecoder()
+    
+    def _loads(data: Union[bytes, str]) -> Any:
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return _DECODER.decode(data)
+    
+    # Also reused: compact separators and no circular-reference tracking,
+    # since messages are always plain trees of dicts and lists. Keys are
+    # never sorted. Non-ASCII stays escaped: the decoder accepts lone
+    # surrogates, and escaping is the only way to echo them back as valid
+    # UTF-8.
+    _ENCODER = json.JSONEncoder(separators=(",", ":"), check_circular=False)
+    
+    def _dumpb(obj: Any) -> bytes:
+        return _ENCODER.encode(obj).encode("ascii")
+    
+    def _dumps_pretty(obj: Any) -> str:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+
 
 class AnkiRequestError(Exception):
     """Raised when an error occurs communicating with AnkiConnect."""
 
 
+# Persistent keep-alive connection to AnkiConnect, one per thread since
+# requests are served from a worker pool. AnkiConnect is a single local
+# endpoint without cookies, auth or redirects, so a bare HTTPConnection is
+# all that is needed.
+_ANKI_HEADERS = {"Content-Type": "application/json", "Connection": "keep-alive"}
+_local = threading.local()
+
+# Errors meaning AnkiConnect dropped an idle keep-alive connection
+_STALE_CONNECTION_ERRORS = (
+    http.client.BadStatusLine,  # includes RemoteDisconnected
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+def _connection_dropped(conn: http.client.HTTPConnection) -> bool:
+    """Whether the peer has closed an idle keep-alive connection."""
+    # An idle connection has nothing to read; if the socket is readable,
+    # the server has sent EOF (or stray data) and the socket is unusable.
+    return bool(select.select([conn.sock], [], [], 0)[0])
+
+
+def _post_to_anki(body: bytes, write: Optional[str] = None) -> bytes:
+    """
+    POST a JSON body to AnkiConnect and return the raw response body.
+    
+    :param write: For a request that changes the collection, the action
+        name. Such a request is never sent a second time once it went out,
+        since Anki may already have acted on the first copy.
+    :raises AnkiRequestError: If the connection is lost after a write was
+        sent, so it is unknown whether it was applied.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = http.client.HTTPConnection(
+            ANKI_CONNECT_HOST, ANKI_CONNECT_PORT, timeout=10
+        )
+    
+    # A reused connection may have been closed by AnkiConnect while idle.
+    # Check before sending so even writes get a fresh connection then.
+    reused = conn.sock is not None
+    if reused and _connection_dropped(conn):
+        conn.close()
+        reused = False
+    
+    # If a reused connection still fails, reconnect and retry once, unless
+    # the request went out and isn't safe to repeat.
+    while True:
+        sent = False
+        try:
+            conn.request("POST", "/", body, _ANKI_HEADERS)
+            sent = True
+            resp = conn.getresponse()
+            data = resp.read()
+            break
+        except (OSError, http.client.HTTPException) as exc:
+            conn.close()
+            if sent and write is not None:
+                raise AnkiRequestError(
+                    f"Connection to AnkiConnect lost after sending {write}; "
+                    f"it may have been applied"
+                ) from exc
+            if not (reused and isinstance(exc, _STALE_CONNECTION_ERRORS)):
+                raise
+            reused = False
+        except Exception:
+            conn.close()
+            raise
+    
+    if resp.status != 200:
+        raise AnkiRequestError(f"AnkiConnect returned HTTP {resp.status} {resp.reason}")
+    return data
+
+
+# Actions that change the collection; sending any of them drops the
+# metadata cache below so later reads see the change. They are also never
+# re-sent after a dropped connection, since Anki may have applied them.
+_MUTATING_ACTIONS = frozenset((
+    "createDeck", "deleteDecks", "changeDeck",
+    "addNote", "addNotes", "deleteNotes", "updateNote", "updateNoteFields",
+    "addTags", "removeTags",
+    "createModel", "updateModelTemplates", "updateModelStyling",
+))
+
+
 def anki_request(action: str, params: Optional[Dict[str, Any]] = None) -> Any:
     """
     Make a request to the AnkiConnect HTTP API.
@@ -46,37 +176,367 @@ def anki_request(action: str, params: Optional[Dict[str, Any]] = None) -> Any:
     if params:
         payload["params"] = params
     
+    mutating = action in _MUTATING_ACTIONS or (
+        action == "multi"
+        and any(entry["action"] in _MUTATING_ACTIONS for entry in params["actions"])
+    )
+    
     try:
-        if requests is not None:
-            response = requests.post(
-                "http://localhost:8765",
-                json=payload,
-                timeout=10,
-            )
-            response.raise_for_status()
-            data = response.json()
-        else:
-            # Fall back to urllib if requests is unavailable
-            data = json.dumps(payload).encode("utf-8")
-            req = urllib.request.Request(
-                "http://localhost:8765", data=data, method="POST"
-            )
-            req.add_header("Content-Type", "application/json")
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                body = resp.read().decode("utf-8")
-            data = json.loads(body)
-    except (urllib.error.URLError, urllib.error.HTTPError) as exc:
+        # AnkiConnect always replies with UTF-8 JSON, so parse the raw bytes
+        # directly rather than decoding to str first.
+        data = _loads(_post_to_anki(_dumpb(payload), write=action if mutating else None))
+    except AnkiRequestError:
+        raise
+    except OSError as exc:
         raise AnkiRequestError(
-            f"Could not connect to AnkiConnect at http://localhost:8765: {exc}"
+            f"Could not connect to AnkiConnect at {ANKI_CONNECT_URL}: {exc}"
         ) from exc
     except Exception as exc:
         raise AnkiRequestError(f"Error contacting AnkiConnect: {exc}") from exc
     
+    # Anki saw the request, so even a failed mutation may have changed
+    # something
+    if mutating:
+        _cache_clear()
+    
     if isinstance(data, dict) and data.get("error"):
         raise AnkiRequestError(str(data["error"]))
     return data.get("result")
 
 
+def anki_multi(actions: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Run several AnkiConnect actions in a single HTTP round-trip.
+    
+    :param actions: Sub-actions as ``{"action": ..., "params": ...}`` dicts;
+        ``params`` may be omitted.
+    :returns: The `result` of each sub-action, in the same order.
+    :raises AnkiRequestError: If the request fails or any sub-action errors.
+    """
+    sub_actions = []
+    for entry in actions:
+        sub_action = {"action": entry["action"], "version": 6}
+        if entry.get("params"):
+            sub_action["params"] = entry["params"]
+        sub_actions.append(sub_action)
+    
+    results = anki_request("multi", {"actions": sub_actions})
+    
+    # Versioned sub-actions come back wrapped as {"result": ..., "error": ...}
+    unwrapped = []
+    for entry, item in zip(sub_actions, results):
+        if isinstance(item, dict) and item.get("error"):
+            raise AnkiRequestError(f"{entry['action']}: {item['error']}")
+        unwrapped.append(item.get("result") if isinstance(item, dict) else item)
+    return unwrapped
+
+
+# Shared stand-in for absent params/arguments. Read-only, so a handler can't
+# accidentally mutate it and leak state into later requests.
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+# Short-lived cache for collection metadata (deck/model names and model
+# definitions). These change rarely, so repeated reads within the TTL are
+# served without a round-trip. Sending a mutating action clears it.
+CACHE_TTL = 5.0
+# key -> (expires, result, reverse id -> name index or None)
+_cache: Dict[Tuple[str, Any], Tuple[float, Any, Optional[Dict[int, str]]]] = {}
+_cache_lock = threading.Lock()
+# Bumped by every clear; a fetch that started in an older generation may
+# predate the change that caused the clear, so its results aren't stored
+_cache_generation = 0
+
+# Actions whose {name: id} results also get a reverse id -> name index,
+# cached in the same entry, so resource reads resolve ids in O(1).
+_ID_INDEXED_ACTIONS = frozenset(("deckNamesAndIds", "modelNamesAndIds"))
+
+
+def _cache_key(action: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Any]:
+    return (action, tuple(sorted(params.items())) if params else None)
+
+
+def _cache_clear() -> None:
+    """Drop every cached AnkiConnect result."""
+    global _cache_generation
+    with _cache_lock:
+        _cache.clear()
+        _cache_generation += 1
+
+
+def _cached_entries(
+    actions: List[Dict[str, Any]], ttl: float
+) -> List[Tuple[Any, Optional[Dict[int, str]]]]:
+    """
+    Fetch `actions` through the cache, as (result, id index) pairs.
+    
+    Only the actions missing from the cache are sent to AnkiConnect, as a
+    single request.
+    """
+    keys = [_cache_key(entry["action"], entry.get("params")) for entry in actions]
+    now = time.monotonic()
+    entries: List[Any] = [None] * len(actions)
+    missing: List[int] = []
+    with _cache_lock:
+        generation = _cache_generation
+        for i, key in enumerate(keys):
+            hit = _cache.get(key)
+            if hit is not None and hit[0] > now:
+                entries[i] = hit[1:]
+            else:
+                missing.append(i)
+    
+    if missing:
+        if len(missing) == 1:
+            entry = actions[missing[0]]
+            fetched = [anki_request(entry["action"], entry.get("params"))]
+        else:
+            fetched = anki_multi([actions[i] for i in missing])
+        for i, value in zip(missing, fetched):
+            index = None
+            if actions[i]["action"] in _ID_INDEXED_ACTIONS:
+                index = {id_: name for name, id_ in value.items()}
+            entries[i] = (value, index)
+        expires = time.monotonic() + ttl
+        with _cache_lock:
+            if _cache_generation == generation:
+                for i in missing:
+                    _cache[keys[i]] = (expires, *entries[i])
+    return entries
+
+
+def _cached_anki_multi(
+    actions: List[Dict[str, Any]], ttl: float = CACHE_TTL
+) -> List[Any]:
+    """Like anki_multi, but serve fresh results from the metadata cache."""
+    return [value for value, _ in _cached_entries(actions, ttl)]
+
+
+def _cached_anki_request(
+    action: str, params: Optional[Dict[str, Any]] = None, ttl: float = CACHE_TTL
+) -> Any:
+    """Cached variant of anki_request for rarely-changing metadata."""
+    return _cached_anki_multi([{"action": action, "params": params}], ttl)[0]
+
+
+def _cached_names_and_ids(action: str) -> Tuple[Dict[str, int], Dict[int, str]]:
+    """
+    Cached deckNamesAndIds/modelNamesAndIds with its id -> name index.
+    
+    Both maps come from the same cache entry, so a concurrent cache clear
+    can't leave the caller with one and not the other.
+    """
+    return _cached_entries([{"action": action}], CACHE_TTL)[0]
+
+
+# Metadata nearly every session asks for early on (listDecks, listModels,
+# resources/list, resource reads)
+_PREFETCH_ACTIONS = ("deckNames", "modelNames", "deckNamesAndIds", "modelNamesAndIds")
+
+
+def _prefetch_metadata() -> None:
+    """Warm the metadata cache with deck and model names in one round-trip."""
+    try:
+        _cached_anki_multi([{"action": action} for action in _PREFETCH_ACTIONS])
+    except AnkiRequestError as exc:
+        logger.debug("Skipping metadata prefetch: %s", exc)
+
+
+# Largest list of note ids / full notes sent in a single AnkiConnect action
+NOTE_ID_CHUNK_SIZE = 2000
+NOTE_CHUNK_SIZE = 500
+
+
+def _anki_request_chunked(
+    action: str,
+    key: str,
+    items: List[Any],
+    params: Optional[Dict[str, Any]] = None,
+    chunk_size: int = NOTE_ID_CHUNK_SIZE,
+) -> List[Any]:
+    """
+    Run `action` over `items` in chunks of `chunk_size`.
+    
+    Each chunk becomes one sub-action of a single multi request, so very
+    large lists stay within AnkiConnect's limits without extra round-trips.
+    
+    :param key: The parameter name the chunk of items is passed under.
+    :param params: Extra parameters included with every chunk.
+    :returns: The result of each chunk, in order.
+    """
+    params = params or {}
+    if len(items) <= chunk_size:
+        return [anki_request(action, {**params, key: items})]
+    return anki_multi([
+        {"action": action, "params": {**params, key: items[i:i + chunk_size]}}
+        for i in range(0, len(items), chunk_size)
+    ])
+
+
+def _find_deck_notes_and_due_cards(deck_name: str) -> Tuple[List[int], List[int]]:
+    """Return the deck's note ids and due card ids in one round-trip."""
+    query = f"deck:'{deck_name}'"
+    note_ids, due_card_ids = anki_multi([
+        {"action": "findNotes", "params": {"query": query}},
+        {"action": "findCards", "params": {"query": query + " is:due"}},
+    ])
+    return note_ids, due_card_ids
+
+
+def _json_resource(uri: str, info: Any) -> Dict[str, Any]:
+    """Wrap AnkiConnect data as a resources/read result in one encoding pass."""
+    return {
+        "contents": [{
+            "uri": uri,
+            "mimeType": "application/json",
+            "text": _dumps_pretty(info)
+        }]
+    }
+
+
+# Canonical instances of schema nodes, keyed by their serialized form
+_schema_nodes: Dict[bytes, Any] = {}
+
+
+def _intern_schema(node: Any) -> Any:
+    """
+    Return `node` with equal sub-schemas replaced by one shared instance.
+    
+    Tool schemas repeat the same pieces ({"type": "string"}, the note-id
+    array, the empty properties object...), so registered tools end up
+    sharing them instead of each holding a copy. The shared nodes are plain
+    dicts and lists so they still serialize; nothing mutates them after
+    registration.
+    """
+    if isinstance(node, dict):
+        node = {key: _intern_schema(value) for key, value in node.items()}
+    elif isinstance(node, list):
+        node = [_intern_schema(value) for value in node]
+    else:
+        return node
+    return _schema_nodes.setdefault(_dumpb(node), node)
+
+
+# JSON Schema types checked by tool argument validators
+_JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "object": dict,
+}
+
+
+def _compile_validator(schema: Dict[str, Any]) -> Callable[[Mapping[str, Any]], None]:
+    """
+    Build an argument check for a tool's input schema.
+    
+    The schema is walked once, at registration; the returned function only
+    loops over the precomputed required keys and property types. Array
+    properties are not type-checked since several handlers also accept a
+    single value there.
+    """
+    required = tuple(schema.get("required", ()))
+    typed = tuple(
+        (key, prop["type"], _JSON_TYPES[prop["type"]])
+        for key, prop in schema.get("properties", {}).items()
+        if prop.get("type") in _JSON_TYPES
+    )
+    
+    def validate(args: Mapping[str, Any]) -> None:
+        if not isinstance(args, Mapping):
+            raise ValueError("'arguments' must be an object")
+        for key in required:
+            if key not in args:
+                raise ValueError(f"'{key}' is required")
+        for key, type_name, py_type in typed:
+            value = args.get(key)
+            if value is None:
+                continue
+            # bool is an int subclass but not a JSON integer/number
+            if not isinstance(value, py_type) or (
+                isinstance(value, bool) and type_name in ("integer", "number")
+            ):
+                raise ValueError(f"'{key}' must be of type {type_name}")
+    
+    return validate
+
+
+# findNotes sample size: notes previewed by default / at most, and how many
+# fields are shown per note
+FIND_NOTES_DEFAULT_LIMIT = 5
+FIND_NOTES_MAX_LIMIT = 25
+FIND_NOTES_PREVIEW_FIELDS = 3
+
+
+_RE_STYLE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL)
+_RE_BR = re.compile(r'<br\s*/?>')
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_BLANK = re.compile(r'\n\s*\n')
+
+
+def _clean_html_content(html_text: str) -> str:
+    """Remove CSS styles and clean up HTML content."""
+    if not html_text:
+        return ""
+    # Remove style tags and their content
+    text = _RE_STYLE.sub('', html_text)
+    # Replace br tags with newlines
+    text = _RE_BR.sub('\n', text)
+    # Remove remaining HTML tags but keep content
+    text = _RE_TAG.sub('', text)
+    # Clean up excessive whitespace
+    text = _RE_BLANK.sub('\n', text)
+    return text.strip()
+
+
+# Fields every note must provide, and the options used when a note has none.
+# The options dict is shared between notes; it is only ever serialized.
+_NOTE_REQUIRED = ("deckName", "modelName", "fields")
+_DEFAULT_NOTE_OPTIONS = {"allowDuplicate": False}
+
+
+def _error_response(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    """Build a JSON-RPC error response."""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message}
+    }
+
+
+# Returned by _check_envelope for a malformed message that must not be
+# answered: a notification with bad params
+_NO_REPLY: Dict[str, Any] = {}
+
+
+def _check_envelope(request: Any) -> Optional[Dict[str, Any]]:
+    """
+    Check the shape of a JSON-RPC request before it is dispatched.
+    
+    :returns: The error response for a malformed request, `_NO_REPLY` for a
+        malformed notification, or None if the request is well-formed.
+    """
+    if not isinstance(request, dict):
+        return _error_response(None, -32600, "Invalid Request: expected a JSON object")
+    if request.get("jsonrpc") != "2.0":
+        return _error_response(
+            request.get("id"), -32600, "Invalid Request: 'jsonrpc' must be \"2.0\""
+        )
+    if not isinstance(request.get("method"), str):
+        return _error_response(
+            request.get("id"), -32600, "Invalid Request: 'method' must be a string"
+        )
+    if "params" in request and not isinstance(request["params"], dict):
+        if "id" not in request:
+            logger.warning("Ignoring notification %s: 'params' must be an object", request["method"])
+            return _NO_REPLY
+        return _error_response(
+            request.get("id"), -32602, "Invalid params: 'params' must be an object"
+        )
+    return None
+
+
 class MCPServer:
     """
     MCP server implementation following the 2025-06-18 protocol specification.
@@ -89,8 +549,43 @@ class MCPServer:
             "version": "2.0.0"
         }
         self.initialized = False
+        # The initialize result never changes, so build it once
+        self._initialize_response = {
+            "protocolVersion": self.protocol_version,
+            "capabilities": {
+                "resources": {
+                    "subscribe": False,
+                    "listChanged": False
+                },
+                "tools": {
+                    "listChanged": False
+                }
+            },
+            "serverInfo": self.server_info
+        }
         # Registry of tools: name -> (description, input_schema, handler)
         self.tools: Dict[str, Tuple[str, Dict[str, Any], Callable[[Dict[str, Any]], Any]]] = {}
+        # Argument validators compiled from each tool's input schema
+        self._validators: Dict[str, Callable[[Mapping[str, Any]], None]] = {}
+        # tools/list result, built on first use and reset by register_tool
+        self._tools_list_response: Optional[Dict[str, Any]] = None
+        # Serialized tools/list result, set by _freeze_tool_catalog
+        self._tools_list_json: Optional[bytes] = None
+        # JSON-RPC method name -> handler
+        self._methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "initialize": self.handle_initialize,
+            "resources/list": self.handle_resources_list,
+            "resources/read": self.handle_resources_read,
+            "tools/list": self.handle_tools_list,
+            "tools/call": self.handle_tools_call,
+        }
+        # Notification name -> handler; notifications never get a response
+        self._notifications: Dict[str, Callable[[Mapping[str, Any]], None]] = {
+            "notifications/initialized": self.handle_initialized,
+        }
+        # Methods that may block on AnkiConnect; the stdio loop runs these on
+        # worker threads so they don't hold up other requests
+        self.blocking_methods = {"resources/list", "resources/read", "tools/call"}
     
     def register_tool(
         self,
@@ -100,41 +595,43 @@ class MCPServer:
         handler: Callable[[Dict[str, Any]], Any],
     ) -> None:
         """Register a tool that can be called via tools/call."""
+        input_schema = _intern_schema(input_schema)
         self.tools[name] = (description, input_schema, handler)
+        self._validators[name] = _compile_validator(input_schema)
+        self._tools_list_response = None
+        self._tools_list_json = None
+    
+    def _freeze_tool_catalog(self) -> None:
+        """Serialize the tools/list result once all tools are registered."""
+        self._tools_list_json = _dumpb(self.handle_tools_list(_EMPTY))
     
     def handle_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Handle the initialize request."""
         client_version = params.get("protocolVersion", self.protocol_version)
-        client_capabilities = params.get("capabilities", {})
         
-        logger.info(f"Client requesting protocol version: {client_version}")
+        logger.info("Client requesting protocol version: %s", client_version)
         
         # Return our capabilities
-        return {
-            "protocolVersion": self.protocol_version,
-            "capabilities": {
-                "resources": {
-                    "subscribe": False,
-                    "listChanged": False
-                },
-                "tools": {
-                    "listChanged": False
-                }
-            },
-            "serverInfo": self.server_info
-        }
+        return self._initialize_response
     
     def handle_initialized(self, params: Dict[str, Any]) -> None:
         """Handle the initialized notification."""
         self.initialized = True
         logger.info("Server initialized successfully")
+        # Fetch deck/model names in the background so the client's first
+        # listing requests are served from the cache
+        threading.Thread(target=_prefetch_metadata, daemon=True).start()
     
     def handle_resources_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Return a list of available resources (decks, models and notes)."""
         resources: List[Dict[str, Any]] = []
         try:
+            deck_map, model_map = _cached_anki_multi([
+                {"action": "deckNamesAndIds"},  # returns {name: id}
+                {"action": "modelNamesAndIds"},
+            ])
+            
             # Decks
-            deck_map = anki_request("deckNamesAndIds")  # returns {name: id}
             for name, deck_id in deck_map.items():
                 resources.append({
                     "uri": f"anki://decks/{deck_id}",
@@ -144,7 +641,6 @@ class MCPServer:
                 })
             
             # Models
-            model_map = anki_request("modelNamesAndIds")
             for name, model_id in model_map.items():
                 resources.append({
                     "uri": f"anki://models/{model_id}",
@@ -153,7 +649,7 @@ class MCPServer:
                     "mimeType": "application/json"
                 })
         except AnkiRequestError as exc:
-            logger.error(f"Error listing resources: {exc}")
+            logger.error("Error listing resources: %s", exc)
             # Return empty list if Anki isn't available
             
         return {"resources": resources}
@@ -178,13 +674,12 @@ class MCPServer:
     
     def _read_deck(self, deck_id: int) -> Dict[str, Any]:
         """Return detailed information about a deck."""
-        deck_map = anki_request("deckNamesAndIds")
-        name = next((n for n, i in deck_map.items() if i == deck_id), None)
+        _, deck_id_to_name = _cached_names_and_ids("deckNamesAndIds")
+        name = deck_id_to_name.get(deck_id)
         if not name:
             raise ValueError(f"Deck ID {deck_id} not found")
         
-        note_ids = anki_request("findNotes", {"query": f"deck:'{name}'"})
-        due_card_ids = anki_request("findCards", {"query": f"deck:'{name}' is:due"})
+        note_ids, due_card_ids = _find_deck_notes_and_due_cards(name)
         
         info = {
             "deckId": deck_id,
@@ -194,24 +689,21 @@ class MCPServer:
             "noteIds": note_ids[:10]  # First 10 note IDs as sample
         }
         
-        return {
-            "contents": [{
-                "uri": f"anki://decks/{deck_id}",
-                "mimeType": "application/json",
-                "text": json.dumps(info, indent=2)
-            }]
-        }
+        return _json_resource(f"anki://decks/{deck_id}", info)
     
     def _read_model(self, model_id: int) -> Dict[str, Any]:
         """Return detailed information about a model."""
-        model_map = anki_request("modelNamesAndIds")
-        name = next((n for n, i in model_map.items() if i == model_id), None)
+        _, model_id_to_name = _cached_names_and_ids("modelNamesAndIds")
+        name = model_id_to_name.get(model_id)
         if not name:
             raise ValueError(f"Model ID {model_id} not found")
         
-        fields = anki_request("modelFieldNames", {"modelName": name})
-        templates = anki_request("modelTemplates", {"modelName": name})
-        styling = anki_request("modelStyling", {"modelName": name})
+        model_params = {"modelName": name}
+        fields, templates, styling = _cached_anki_multi([
+            {"action": "modelFieldNames", "params": model_params},
+            {"action": "modelTemplates", "params": model_params},
+            {"action": "modelStyling", "params": model_params},
+        ])
         
         info = {
             "modelId": model_id,
@@ -221,42 +713,31 @@ class MCPServer:
             "styling": styling
         }
         
-        return {
-            "contents": [{
-                "uri": f"anki://models/{model_id}",
-                "mimeType": "application/json",
-                "text": json.dumps(info, indent=2)
-            }]
-        }
+        return _json_resource(f"anki://models/{model_id}", info)
     
     def _read_note(self, note_id: int) -> Dict[str, Any]:
         """Return detailed information about a note."""
         result = anki_request("notesInfo", {"notes": [note_id]})
-        info = result[0] if result else {}
-        
-        return {
-            "contents": [{
-                "uri": f"anki://notes/{note_id}",
-                "mimeType": "application/json",
-                "text": json.dumps(info, indent=2)
-            }]
-        }
+        return _json_resource(f"anki://notes/{note_id}", result[0] if result else {})
     
     def handle_tools_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Return a list of available tools."""
-        tools_list = []
-        for name, (desc, schema, _) in self.tools.items():
-            tools_list.append({
-                "name": name,
-                "description": desc,
-                "inputSchema": schema
-            })
-        return {"tools": tools_list}
+        if self._tools_list_response is None:
+            tools_list = []
+            for name, (desc, schema, _) in self.tools.items():
+                tools_list.append({
+                    "name": name,
+                    "description": desc,
+                    "inputSchema": schema
+                })
+            self._tools_list_response = {"tools": tools_list}
+        return self._tools_list_response
     
     def handle_tools_call(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a tool and return the result."""
-        tool_name = params.get("name")
-        arguments = params.get("arguments", {})
+        get = params.get
+        tool_name = get("name")
+        arguments = get("arguments") or _EMPTY
         
         if not tool_name:
             raise ValueError("'name' parameter is required")
@@ -265,58 +746,63 @@ class MCPServer:
             raise ValueError(f"Tool '{tool_name}' not found")
         
         _, _, handler = self.tools[tool_name]
+        validate = self._validators[tool_name]
         
         try:
+            validate(arguments)
             result = handler(arguments)
+            # Tool handlers return str already; only convert anything else
             return {
                 "content": [{
                     "type": "text",
-                    "text": str(result)
+                    "text": result if type(result) is str else str(result)
                 }]
             }
         except Exception as e:
-            logger.error(f"Tool execution error: {e}")
+            message = str(e)
+            logger.error("Tool execution error: %s", message)
             return {
                 "content": [{
                     "type": "text",
-                    "text": f"Error: {str(e)}"
+                    "text": f"Error: {message}"
                 }],
                 "isError": True
             }
     
+    def handle_notification(self, method: str, params: Mapping[str, Any]) -> None:
+        """Handle a JSON-RPC notification. Unknown notifications are ignored."""
+        handler = self._notifications.get(method)
+        if handler is None:
+            logger.debug("Ignoring notification: %s", method)
+            return
+        try:
+            handler(params)
+        except Exception as exc:
+            logger.error("Error handling notification %s: %s", method, exc)
+    
     def handle_request(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Handle incoming JSON-RPC request."""
+        error = _check_envelope(request)
+        if error is not None:
+            return None if error is _NO_REPLY else error
+        
         request_id = request.get("id")
-        method = request.get("method")
-        params = request.get("params", {})
+        method = request["method"]
+        # Only an empty object can be falsy here, after _check_envelope
+        params = request.get("params") or _EMPTY
         
-        logger.debug(f"Handling request: {method}")
+        logger.debug("Handling request: %s", method)
+        
+        if method in self._notifications:
+            self.handle_notification(method, params)
+            return None  # Notifications don't get responses
+        
+        handler = self._methods.get(method)
+        if handler is None:
+            return _error_response(request_id, -32601, f"Method not found: {method}")
         
         try:
-            # Handle different methods according to MCP spec
-            if method == "initialize":
-                result = self.handle_initialize(params)
-            elif method == "notifications/initialized":
-                self.handle_initialized(params)
-                return None  # Notifications don't get responses
-            elif method == "resources/list":
-                result = self.handle_resources_list(params)
-            elif method == "resources/read":
-                result = self.handle_resources_read(params)
-            elif method == "tools/list":
-                result = self.handle_tools_list(params)
-            elif method == "tools/call":
-                result = self.handle_tools_call(params)
-            else:
-                # Method not found
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": f"Method not found: {method}"
-                    }
-                }
+            result = handler(params)
             
             # Return successful response
             return {
@@ -326,23 +812,16 @@ class MCPServer:
             }
             
         except Exception as exc:
-            logger.error(f"Error handling request: {exc}")
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "error": {
-                    "code": -32603,
-                    "message": str(exc)
-                }
-            }
+            logger.error("Error handling request: %s", exc)
+            return _error_response(request_id, -32603, str(exc))
     
     # Tool handler methods
     def _tool_list_decks(self, args: Dict[str, Any]) -> str:
-        decks = anki_request("deckNames")
+        decks = _cached_anki_request("deckNames")
         return f"Available decks: {', '.join(decks)}" if decks else "No decks found."
     
     def _tool_list_models(self, args: Dict[str, Any]) -> str:
-        models = anki_request("modelNames")
+        models = _cached_anki_request("modelNames")
         return f"Available models: {', '.join(models)}" if models else "No models found."
     
     def _tool_get_deck_info(self, args: Dict[str, Any]) -> str:
@@ -350,13 +829,12 @@ class MCPServer:
         if not deck_name:
             raise ValueError("'deckName' is required")
         
-        deck_map = anki_request("deckNamesAndIds")
+        deck_map = _cached_anki_request("deckNamesAndIds")
         deck_id = deck_map.get(deck_name)
         if deck_id is None:
             raise ValueError(f"Deck '{deck_name}' not found")
         
-        note_ids = anki_request("findNotes", {"query": f"deck:'{deck_name}'"})
-        due_ids = anki_request("findCards", {"query": f"deck:'{deck_name}' is:due"})
+        note_ids, due_ids = _find_deck_notes_and_due_cards(deck_name)
         
         info = {
             "deckId": deck_id,
@@ -364,7 +842,7 @@ class MCPServer:
             "numNotes": len(note_ids),
             "numDueCards": len(due_ids)
         }
-        return json.dumps(info, indent=2)
+        return _dumps_pretty(info)
     
     def _tool_create_deck(self, args: Dict[str, Any]) -> str:
         name = args.get("deckName")
@@ -377,16 +855,15 @@ class MCPServer:
         return f"Created deck '{name}' with ID {result}."
     
     def _tool_add_note(self, args: Dict[str, Any]) -> str:
-        required = ["deckName", "modelName", "fields"]
-        for key in required:
-            if key not in args or not args[key]:
+        for key in _NOTE_REQUIRED:
+            if not args.get(key):
                 raise ValueError(f"'{key}' is required")
         
         note = {
             "deckName": args["deckName"],
             "modelName": args["modelName"],
             "fields": args["fields"],
-            "options": args.get("options", {"allowDuplicate": False}),
+            "options": args.get("options", _DEFAULT_NOTE_OPTIONS),
             "tags": args.get("tags", [])
         }
         
@@ -400,21 +877,33 @@ class MCPServer:
         if not query:
             raise ValueError("'query' is required")
         
+        limit = args.get("limit", FIND_NOTES_DEFAULT_LIMIT)
+        if type(limit) is not int or limit < 0:  # bool is not a valid limit
+            raise ValueError("'limit' must be a non-negative integer")
+        limit = min(limit, FIND_NOTES_MAX_LIMIT)
+        
         ids = anki_request("findNotes", {"query": query})
         if not ids:
             return "No notes found."
+        if limit == 0:
+            return f"Found {len(ids)} notes."
         
         # Get info for first few notes
-        sample_ids = ids[:5]
+        sample_ids = ids[:limit]
         notes_info = anki_request("notesInfo", {"notes": sample_ids})
         
-        result = f"Found {len(ids)} notes. First {len(sample_ids)}:\n"
+        parts = [f"Found {len(ids)} notes. First {len(sample_ids)}:\n"]
         for note in notes_info:
-            fields_summary = ", ".join(f"{k}: {v[:30]}..." if len(v) > 30 else f"{k}: {v}" 
-                                     for k, v in note.get("fields", {}).items())
-            result += f"- ID {note['noteId']}: {fields_summary}\n"
+            previews = []
+            # Only the first few fields are previewed, so stop there
+            for k, v in islice(note.get("fields", {}).items(), FIND_NOTES_PREVIEW_FIELDS):
+                # notesInfo returns fields as {"value": ..., "order": ...}
+                if isinstance(v, dict):
+                    v = v.get("value", "")
+                previews.append(f"{k}: {v if len(v) <= 30 else v[:30] + '...'}")
+            parts.append(f"- ID {note['noteId']}: {', '.join(previews)}\n")
         
-        return result
+        return "".join(parts)
     
     def _tool_update_note_fields(self, args: Dict[str, Any]) -> str:
         note_id = args.get("noteId")
@@ -436,7 +925,7 @@ class MCPServer:
             note_ids = [note_ids]
         
         tags_str = " ".join(tags) if isinstance(tags, list) else tags
-        anki_request("addTags", {"notes": note_ids, "tags": tags_str})
+        _anki_request_chunked("addTags", "notes", note_ids, {"tags": tags_str})
         
         return f"Added tags '{tags_str}' to {len(note_ids)} note(s)."
     
@@ -448,7 +937,7 @@ class MCPServer:
         if isinstance(note_ids, int):
             note_ids = [note_ids]
         
-        anki_request("deleteNotes", {"notes": note_ids})
+        _anki_request_chunked("deleteNotes", "notes", note_ids)
         return f"Deleted {len(note_ids)} note(s)."
     
     def _tool_add_notes_batch(self, args: Dict[str, Any]) -> str:
@@ -457,27 +946,27 @@ class MCPServer:
         if not notes or not isinstance(notes, list):
             raise ValueError("'notes' must be a list of note objects")
         
-        # Validate each note has required fields
+        # Validate each note has required fields and fill in defaults
         for i, note in enumerate(notes):
-            required = ["deckName", "modelName", "fields"]
-            for key in required:
-                if key not in note or not note[key]:
-                    raise ValueError(f"Note {i}: '{key}' is required")
-            
-            # Ensure tags is present (can be empty list)
-            if "tags" not in note:
-                note["tags"] = []
-            
-            # Set default options if not provided
-            if "options" not in note:
-                note["options"] = {"allowDuplicate": False}
+            missing = next((key for key in _NOTE_REQUIRED if not note.get(key)), None)
+            if missing:
+                raise ValueError(f"Note {i}: '{missing}' is required")
+            note.setdefault("tags", [])
+            note.setdefault("options", _DEFAULT_NOTE_OPTIONS)
         
-        # Make the batch request
-        result = anki_request("addNotes", {"notes": notes})
+        # Make the batch request; very large batches are split into addNotes
+        # chunks that still travel in a single multi request
+        chunks = _anki_request_chunked("addNotes", "notes", notes, chunk_size=NOTE_CHUNK_SIZE)
+        result = [id_ for chunk in chunks for id_ in chunk]
         
-        # Analyze results
-        successful = [id_ for id_ in result if id_ is not None]
-        failed = [i for i, id_ in enumerate(result) if id_ is None]
+        # Analyze results in a single pass
+        successful = []
+        failed = []
+        for i, id_ in enumerate(result):
+            if id_ is None:
+                failed.append(i)
+            else:
+                successful.append(id_)
         
         response = f"Batch operation completed: {len(successful)} notes created successfully"
         if failed:
@@ -498,8 +987,9 @@ class MCPServer:
         # Use AnkiConnect's canAddNotes to validate
         result = anki_request("canAddNotes", {"notes": notes})
         
-        valid_count = sum(result)
+        # One pass: the valid count follows from the invalid indices
         invalid_indices = [i for i, valid in enumerate(result) if not valid]
+        valid_count = len(result) - len(invalid_indices)
         
         response = f"Validation completed: {valid_count}/{len(notes)} notes can be added"
         if invalid_indices:
@@ -515,23 +1005,6 @@ class MCPServer:
             if result is None:
                 return "No card is currently being reviewed in Anki."
             
-            import re
-            
-            def clean_html_content(html_text):
-                """Remove CSS styles and clean up HTML content."""
-                if not html_text:
-                    return ""
-                # Remove style tags and their content
-                text = re.sub(r'<style[^>]*>.*?</style>', '', html_text, flags=re.DOTALL)
-                # Replace br tags with newlines
-                text = text.replace('<br>', '\n').replace('<br/>', '\n').replace('<br />', '\n')
-                # Remove remaining HTML tags but keep content
-                text = re.sub(r'<[^>]+>', '', text)
-                # Clean up excessive whitespace
-                text = re.sub(r'\n\s*\n', '\n', text)
-                text = text.strip()
-                return text
-            
             # Extract clean field values
             fields = result.get("fields", {})
             
@@ -543,12 +1016,12 @@ class MCPServer:
             if "Front" in fields:
                 question = fields["Front"].get("value", "") if isinstance(fields["Front"], dict) else fields["Front"]
             elif result.get("question"):
-                question = clean_html_content(result.get("question", ""))
+                question = _clean_html_content(result.get("question", ""))
                 
             if "Back" in fields:
                 answer = fields["Back"].get("value", "") if isinstance(fields["Back"], dict) else fields["Back"]
             elif result.get("answer"):
-                answer = clean_html_content(result.get("answer", ""))
+                answer = _clean_html_content(result.get("answer", ""))
             
             # Simple, clean output with just Q&A
             card_info = {
@@ -557,13 +1030,203 @@ class MCPServer:
                 "answer": answer
             }
             
-            return json.dumps(card_info, indent=2)
+            return _dumps_pretty(card_info)
         except AnkiRequestError as e:
             if "Collection is not open" in str(e):
                 return "Anki is not currently in review mode or no deck is open."
             return f"Error getting current card: {str(e)}"
 
 
+# Upper bound on requests handled concurrently (and so on AnkiConnect calls
+# in flight at once)
+MAX_CONCURRENT_REQUESTS = 8
+
+# Buffer size for the stdio streams
+STDIO_BUFFER_SIZE = 1 << 16
+
+# Largest body accepted in a Content-Length framed message
+MAX_MESSAGE_SIZE = 64 << 20
+
+# Parse error reply with only the message left to fill in; malformed input
+# never has an id, so the rest is constant
+_PARSE_ERROR = b'{"jsonrpc":"2.0","id":null,"error":{"code":-32700,"message":%s}}'
+
+
+async def serve(server: MCPServer) -> None:
+    """
+    Read JSON-RPC messages from stdin and write responses to stdout.
+    
+    Requests that may block on AnkiConnect run on a thread pool, so a slow
+    call doesn't stall the ones behind it; responses are written as they
+    complete and matched to requests by id. Everything else is handled
+    inline, in arrival order.
+    
+    Messages are newline-delimited, as the MCP stdio transport specifies.
+    LSP-style ``Content-Length:`` framed messages are accepted too, and the
+    reply to each one is framed the same way.
+    """
+    loop = asyncio.get_event_loop()
+    workers = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+    stdin_reader = ThreadPoolExecutor(max_workers=1)
+    # Read raw bytes through a larger buffer than the default 8 KiB, so big
+    # addNotesBatch/canAddNotes payloads arrive in fewer read() syscalls.
+    # _loads parses UTF-8 bytes directly; no text-mode decode is needed.
+    stdin = io.BufferedReader(
+        getattr(sys.stdin.buffer, "raw", sys.stdin.buffer), buffer_size=STDIO_BUFFER_SIZE
+    )
+    # Responses go straight to the binary stdout as serialized bytes,
+    # bypassing print() and the text layer; one flush per message.
+    stdout = io.BufferedWriter(
+        getattr(sys.stdout.buffer, "raw", sys.stdout.buffer), buffer_size=STDIO_BUFFER_SIZE
+    )
+    pending = set()
+    # Bound once for the whole session; both backends keep no per-message
+    # state, so the same parser serves every request
+    parse = _loads
+    # The log level is set once at startup; checking it here skips even the
+    # logger.debug() calls (and their level lookups) per message
+    debug = logger.isEnabledFor(logging.DEBUG)
+    
+    def read_message() -> Optional[Tuple[bytes, bool]]:
+        """
+        Read one message from stdin.
+        
+        :returns: (body, was_framed), or None at end of input.
+        :raises ValueError: If a Content-Length header is unusable; the
+            message is skipped.
+        """
+        line = stdin.readline()
+        if not line:
+            return None
+        if line[:15].lower() != b"content-length:":
+            return line, False
+        # Skip any other headers up to the blank separator line
+        header = stdin.readline()
+        while header.strip():
+            header = stdin.readline()
+        try:
+            length = int(line[15:])
+        except ValueError:
+            raise ValueError(f"invalid Content-Length {line[15:].strip().decode('ascii', 'replace')!r}") from None
+        if length <= 0:
+            raise ValueError(f"invalid Content-Length {length}")
+        if length > MAX_MESSAGE_SIZE:
+            # Discard the body so reading resumes at the next message
+            while length > 0:
+                chunk = stdin.read(min(length, STDIO_BUFFER_SIZE))
+                if not chunk:
+                    break
+                length -= len(chunk)
+            raise ValueError(f"message exceeds {MAX_MESSAGE_SIZE} bytes")
+        # A known length needs no scanning for the end of the message
+        return stdin.read(length), True
+    
+    def write_message(message: bytes, framed: bool) -> None:
+        # Only called from the event loop thread, so writes never interleave
+        if framed:
+            stdout.write(b"Content-Length: %d\r\n\r\n" % len(message))
+            stdout.write(message)
+        else:
+            stdout.write(message)
+            stdout.write(b"\n")
+        stdout.flush()
+    
+    def send(response: Dict[str, Any], framed: bool) -> None:
+        write_message(_dumpb(response), framed)
+        if debug:
+            logger.debug("Sent response: %s", response)
+    
+    def fail(request: Any, exc: Exception, framed: bool) -> None:
+        logger.error("Unexpected error: %s", exc, exc_info=True)
+        # Still answer, under the request's own id, so the client isn't
+        # left waiting
+        if isinstance(request, dict) and "id" in request:
+            try:
+                send(_error_response(request["id"], -32603, f"Internal error: {exc}"), framed)
+            except Exception:
+                logger.error("Could not send error response", exc_info=True)
+    
+    async def dispatch(request: Dict[str, Any], framed: bool) -> None:
+        try:
+            response = await loop.run_in_executor(
+                workers, server.handle_request, request
+            )
+            if response is not None:
+                send(response, framed)
+        except Exception as exc:
+            fail(request, exc, framed)
+    
+    while True:
+        try:
+            message = await loop.run_in_executor(stdin_reader, read_message)
+        except ValueError as exc:  # bad Content-Length header
+            write_message(_PARSE_ERROR % _dumpb(f"Parse error: {exc}"), True)
+            continue
+        if message is None:
+            break
+        # Each reply is framed the way its request was
+        line, framed = message
+        if not line.strip():
+            continue
+        
+        try:
+            request = parse(line)
+        except ValueError as exc:  # malformed JSON or invalid UTF-8
+            write_message(_PARSE_ERROR % _dumpb(f"Parse error: {exc}"), framed)
+            continue
+        
+        try:
+            if debug:
+                logger.debug("Received request: %s", request)
+            
+            # The fast paths below bypass handle_request, so malformed
+            # requests are rejected here first
+            error = _check_envelope(request)
+            if error is not None:
+                if error is not _NO_REPLY:
+                    send(error, framed)
+                continue
+            
+            method = request["method"]
+            
+            # Notifications (no id) never get a response; handle them
+            # directly without going through request dispatch
+            if "id" not in request and method.startswith("notifications/"):
+                server.handle_notification(method, request.get("params") or _EMPTY)
+                continue
+            
+            # The tool catalog is static: splice its pre-serialized
+            # bytes into the reply instead of encoding it again
+            if method == "tools/list" and server._tools_list_json is not None:
+                write_message(
+                    b'{"jsonrpc":"2.0","id":' + _dumpb(request.get("id"))
+                    + b',"result":' + server._tools_list_json + b'}',
+                    framed,
+                )
+                continue
+            
+            if method in server.blocking_methods:
+                task = loop.create_task(dispatch(request, framed))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                continue
+            
+            response = server.handle_request(request)
+            
+            # Only send response if it's not a notification
+            if response is not None:
+                send(response, framed)
+                
+        except Exception as exc:
+            fail(request, exc, framed)
+    
+    # stdin closed: let in-flight requests finish before exiting
+    if pending:
+        await asyncio.wait(pending)
+    workers.shutdown()
+    stdin_reader.shutdown()
+
+
 def main():
     """Main entry point for the MCP server."""
     server = MCPServer()
@@ -673,6 +1336,12 @@ def main():
                 "query": {
                     "type": "string",
                     "description": "Anki search query"
+                },
+                "limit": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "maximum": FIND_NOTES_MAX_LIMIT,
+                    "description": "Number of matching notes to preview (default 5, max 25); 0 returns only the count"
                 }
             },
             "required": ["query"],
@@ -839,36 +1508,15 @@ def main():
         handler=server._tool_gui_current_card
     )
     
+    server._freeze_tool_catalog()
+    
     logger.info("Anki MCP Server v2 starting...")
     
-    # Main loop: read JSON-RPC messages from stdin
-    for line in sys.stdin:
-        if not line.strip():
-            continue
-        
-        try:
-            request = json.loads(line)
-            logger.debug(f"Received request: {request}")
-            
-            response = server.handle_request(request)
-            
-            # Only send response if it's not a notification
-            if response is not None:
-                print(json.dumps(response), flush=True)
-                logger.debug(f"Sent response: {response}")
-                
-        except json.JSONDecodeError as exc:
-            error_response = {
-                "jsonrpc": "2.0",
-                "id": None,
-                "error": {
-                    "code": -32700,
-                    "message": f"Parse error: {exc}"
-                }
-            }
-            print(json.dumps(error_response), flush=True)
-        except Exception as exc:
-            logger.error(f"Unexpected error: {exc}", exc_info=True)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(serve(server))
+    finally:
+        loop.close()
 
 
 if __name__ == "__main__":
@@ -1,55 +1,42 @@
 #!/usr/bin/env python3
 """Test script to verify Anki connection."""
 
+import http.client
 import json
-import urllib.request
-import urllib.error
+
+def post_action(conn, action):
+    """POST an AnkiConnect action over an open connection and return the JSON reply."""
+    payload = {"action": action, "version": 6}
+    conn.request(
+        "POST", "/",
+        json.dumps(payload).encode("utf-8"),
+        {"Content-Type": "application/json", "Connection": "keep-alive"}
+    )
+    resp = conn.getresponse()
+    return json.loads(resp.read())
 
 def test_anki_connection():
     """Test if AnkiConnect is accessible."""
     print("Testing Anki connection...")
     
-    payload = {
-        "action": "version",
-        "version": 6
-    }
+    # One keep-alive connection serves every check below
+    conn = http.client.HTTPConnection("localhost", 8765, timeout=5)
     
     try:
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
-            "http://localhost:8765", 
-            data=data, 
-            method="POST"
-        )
-        req.add_header("Content-Type", "application/json")
+        result = post_action(conn, "version")
         
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            body = resp.read().decode("utf-8")
-            result = json.loads(body)
-            
         print("✓ Successfully connected to AnkiConnect!")
         print(f"  AnkiConnect version: {result.get('result')}")
         
         # Test getting deck names
-        payload = {"action": "deckNames", "version": 6}
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
-            "http://localhost:8765", 
-            data=data, 
-            method="POST"
-        )
-        req.add_header("Content-Type", "application/json")
+        result = post_action(conn, "deckNames")
         
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            body = resp.read().decode("utf-8")
-            result = json.loads(body)
-            
         decks = result.get("result", [])
         print(f"  Found {len(decks)} decks: {', '.join(decks) if decks else 'None'}")
         
         return True
         
-    except urllib.error.URLError as e:
+    except (OSError, http.client.HTTPException) as e:
         print("✗ Failed to connect to AnkiConnect")
         print(f"  Error: {e}")
         print("\n  Make sure:")
@@ -60,6 +47,8 @@ def test_anki_connection():
     except Exception as e:
         print(f"✗ Unexpected error: {e}")
         return False
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     test_anki_connection()
\ No newline at end of file
@@ -4,11 +4,22 @@
 import json
 import subprocess
 import sys
+import threading
 import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Any, Dict, Optional
 import os
 
+try:
+    import orjson
+    _dump = orjson.dumps
+    _load = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib
+    def _dump(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+    _load = json.loads
+
 
 class MCPServerTestCase(unittest.TestCase):
     """Base test case for MCP server tests."""
@@ -78,9 +89,14 @@ class MCPServerTestCase(unittest.TestCase):
             "method": "notifications/initialized",
             "params": {}
         }
-        cls.proc.stdin.write((json.dumps(notify) + "\n").encode())
+        cls.proc.stdin.write(_dump(notify) + b"\n")
         cls.proc.stdin.flush()
-        time.sleep(0.1)  # Give server time to process
+        
+        # stdin is read in order, so once this reply arrives the
+        # notification has been consumed
+        response = cls.send_request({"jsonrpc": "2.0", "id": 999, "method": "tools/list"})
+        assert response is not None and "result" in response, \
+            f"Server not ready after initialization: {response}"
     
     @classmethod
     def send_request(cls, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -88,14 +104,13 @@ class MCPServerTestCase(unittest.TestCase):
         if not cls.proc:
             return None
             
-        request_str = json.dumps(request) + "\n"
-        cls.proc.stdin.write(request_str.encode())
+        cls.proc.stdin.write(_dump(request) + b"\n")
         cls.proc.stdin.flush()
         
         # Read response with timeout
-        response_line = cls.proc.stdout.readline().decode().strip()
-        if response_line:
-            return json.loads(response_line)
+        response_line = cls.proc.stdout.readline()
+        if response_line.strip():
+            return _load(response_line)
         return None
     
     def make_request(self, method: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -143,6 +158,92 @@ class TestMCPProtocol(MCPServerTestCase):
         self.assertEqual(response["error"]["code"], -32601)  # Method not found
         self.assertIn("not found", response["error"]["message"].lower())
     
+    def test_notifications_get_no_response(self):
+        """Test that notifications, known or not, are never answered."""
+        for method in ("notifications/initialized", "notifications/cancelled"):
+            notify = {"jsonrpc": "2.0", "method": method, "params": {}}
+            self.proc.stdin.write(_dump(notify) + b"\n")
+        self.proc.stdin.flush()
+        
+        # The next line on stdout must be the answer to this request
+        response = self.make_request("tools/list")
+        self.assertEqual(response["id"], self.request_id)
+        self.assertIn("result", response)
+    
+    @staticmethod
+    def _run_separate_server(data: bytes) -> list:
+        """Feed `data` to a fresh server; returns its (framed, response) replies."""
+        # A separate server keeps the shared one newline-delimited
+        server_path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "anki_mcp_server.py"
+        )
+        output = subprocess.run(
+            [sys.executable, server_path],
+            input=data,
+            capture_output=True,
+            timeout=10
+        ).stdout
+        
+        replies = []
+        while output:
+            if output.startswith(b"Content-Length:"):
+                header, _, output = output.partition(b"\r\n\r\n")
+                length = int(header[15:])
+                replies.append((True, _load(output[:length])))
+                output = output[length:]
+            else:
+                line, _, output = output.partition(b"\n")
+                replies.append((False, _load(line)))
+        return replies
+    
+    @staticmethod
+    def _frame(request: Dict[str, Any]) -> bytes:
+        body = _dump(request)
+        return b"Content-Length: %d\r\n\r\n" % len(body) + body
+    
+    def test_content_length_framing(self):
+        """Test that Content-Length framed messages get framed replies."""
+        replies = self._run_separate_server(
+            self._frame({"jsonrpc": "2.0", "id": 1, "method": "tools/list"})
+        )
+        
+        self.assertEqual(len(replies), 1)
+        framed, response = replies[0]
+        self.assertTrue(framed)
+        self.assertEqual(response["id"], 1)
+        self.assertIn("tools", response["result"])
+    
+    def test_content_length_not_positive(self):
+        """Test that zero or negative lengths are parse errors, not EOF."""
+        for length in (b"0", b"-1"):
+            follow_up = _dump({"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+            replies = self._run_separate_server(
+                b"Content-Length: " + length + b"\r\n\r\n" + follow_up + b"\n"
+            )
+            
+            self.assertEqual(len(replies), 2, replies)
+            framed, response = replies[0]
+            self.assertTrue(framed)
+            self.assertEqual(response["error"]["code"], -32700)
+            # The request after it is still answered
+            self.assertEqual(replies[1][1]["id"], 2)
+            self.assertIn("result", replies[1][1])
+    
+    def test_mixed_framing(self):
+        """Test that each reply is framed the way its request was."""
+        replies = self._run_separate_server(
+            _dump({
+                "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                "params": {"name": "listDecks", "arguments": {}}
+            }) + b"\n"
+            + self._frame({"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+            + _dump({"jsonrpc": "2.0", "id": 3, "method": "tools/list"}) + b"\n"
+        )
+        
+        framing = {response["id"]: framed for framed, response in replies}
+        self.assertEqual(framing, {1: False, 2: True, 3: False})
+    
     def test_missing_required_params(self):
         """Test that missing required parameters return errors."""
         response = self.make_request("tools/call", {
@@ -275,6 +376,37 @@ class TestToolExecution(MCPServerTestCase):
         content = response["result"]["content"][0]["text"]
         self.assertIn("required", content.lower())
     
+    def test_tool_with_wrong_arg_type(self):
+        """Test calling a tool with an argument of the wrong type."""
+        response = self.make_request("tools/call", {
+            "name": "findNotes",
+            "arguments": {"query": 5}
+        })
+        
+        self.assertIn("result", response)
+        self.assertTrue(response["result"]["isError"])
+        content = response["result"]["content"][0]["text"]
+        self.assertIn("must be of type string", content)
+    
+    def test_find_notes_invalid_limit(self):
+        """Test that findNotes rejects bad limits before contacting Anki."""
+        cases = [
+            (-1, "non-negative integer"),
+            (True, "must be of type integer"),
+            (2.5, "must be of type integer"),
+            ("5", "must be of type integer"),
+        ]
+        for limit, message in cases:
+            response = self.make_request("tools/call", {
+                "name": "findNotes",
+                "arguments": {"query": "deck:Default", "limit": limit}
+            })
+            
+            self.assertTrue(response["result"]["isError"], limit)
+            content = response["result"]["content"][0]["text"]
+            self.assertIn(message, content)
+            self.assertNotIn("AnkiConnect", content)
+    
     def test_gui_current_card_tool(self):
         """Test the guiCurrentCard tool."""
         response = self.make_request("tools/call", {
@@ -342,9 +474,9 @@ class TestErrorHandling(MCPServerTestCase):
         self.proc.stdin.flush()
         
         # Try to read response (should get parse error)
-        response_line = self.proc.stdout.readline().decode().strip()
-        if response_line:
-            response = json.loads(response_line)
+        response_line = self.proc.stdout.readline()
+        if response_line.strip():
+            response = _load(response_line)
             self.assertIn("error", response)
             self.assertEqual(response["error"]["code"], -32700)  # Parse error
     
@@ -353,6 +485,56 @@ class TestErrorHandling(MCPServerTestCase):
         response = self.send_request({})
         if response:
             self.assertIn("error", response)
+            self.assertEqual(response["error"]["code"], -32600)  # Invalid request
+    
+    def test_lone_surrogate_is_answered(self):
+        """Test that a lone surrogate in a request doesn't lose the reply."""
+        # Written by hand: encoders refuse to produce a lone surrogate
+        self.request_id += 1
+        self.proc.stdin.write(
+            b'{"jsonrpc":"2.0","id":%d,"method":"tools/call",'
+            b'"params":{"name":"\\ud800x","arguments":{}}}\n' % self.request_id
+        )
+        self.proc.stdin.flush()
+        response = _load(self.proc.stdout.readline())
+        
+        self.assertIn("error", response)
+        # orjson rejects the input outright; the stdlib parser accepts it,
+        # and the reply must then echo the name back under the request id
+        if response["id"] is not None:
+            self.assertEqual(response["id"], self.request_id)
+            self.assertIn("not found", response["error"]["message"])
+    
+    def test_invalid_params_type(self):
+        """Test that non-object params are rejected."""
+        response = self.send_request({
+            "jsonrpc": "2.0",
+            "id": 77,
+            "method": "tools/call",
+            "params": ["listDecks"]
+        })
+        
+        self.assertEqual(response["id"], 77)
+        self.assertEqual(response["error"]["code"], -32602)  # Invalid params
+        
+        # Falsy non-objects are rejected too
+        for params in ([], 0, "", False):
+            response = self.send_request({
+                "jsonrpc": "2.0", "id": 78, "method": "tools/call", "params": params
+            })
+            self.assertEqual(response["error"]["code"], -32602)
+    
+    def test_invalid_envelope_on_fast_paths(self):
+        """Test that tools/list checks the envelope like other methods."""
+        response = self.send_request({"id": 79, "method": "tools/list"})
+        self.assertEqual(response["id"], 79)
+        self.assertEqual(response["error"]["code"], -32600)  # Missing jsonrpc
+        
+        response = self.send_request({
+            "jsonrpc": "2.0", "id": 80, "method": "tools/list", "params": [1, 2]
+        })
+        self.assertEqual(response["id"], 80)
+        self.assertEqual(response["error"]["code"], -32602)
     
     def test_concurrent_requests(self):
         """Test that server handles multiple rapid requests."""
@@ -366,6 +548,128 @@ class TestErrorHandling(MCPServerTestCase):
         for response in responses:
             self.assertIn("result", response)
             self.assertIn("tools", response["result"])
+    
+    def test_pipelined_requests(self):
+        """Test that requests sent without waiting all get a response."""
+        ids = []
+        for i in range(5):
+            self.request_id += 1
+            ids.append(self.request_id)
+            request = {
+                "jsonrpc": "2.0",
+                "id": self.request_id,
+                "method": "tools/call" if i % 2 else "tools/list",
+                "params": {"name": "listDecks", "arguments": {}} if i % 2 else {}
+            }
+            self.proc.stdin.write(_dump(request) + b"\n")
+        self.proc.stdin.flush()
+        
+        # Responses may arrive in any order; match them up by id
+        responses = {}
+        for _ in ids:
+            response = _load(self.proc.stdout.readline())
+            responses[response["id"]] = response
+        
+        self.assertEqual(sorted(responses), ids)
+        for response in responses.values():
+            self.assertIn("result", response)
+
+
+class StubAnkiHandler(BaseHTTPRequestHandler):
+    """Fake AnkiConnect: records each action and misbehaves on request."""
+    
+    protocol_version = "HTTP/1.1"  # keep-alive, like AnkiConnect
+    
+    def do_POST(self):
+        body = _load(self.rfile.read(int(self.headers["Content-Length"])))
+        action = body["action"]
+        self.server.actions.append(action)
+        if action in self.server.drop:
+            # The request was read, but the reply never comes
+            self.close_connection = True
+            return
+        
+        reply = _dump({"result": 6, "error": None})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+        if action in self.server.close_after:
+            # Close while the client still believes the connection is open
+            self.close_connection = True
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAnkiConnectRetry(unittest.TestCase):
+    """Test when AnkiConnect requests are re-sent over a dropped connection."""
+    
+    @classmethod
+    def setUpClass(cls):
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import anki_mcp_server
+        cls.anki = anki_mcp_server
+        
+        cls.stub = ThreadingHTTPServer(("127.0.0.1", 0), StubAnkiHandler)
+        cls.stub.daemon_threads = True
+        threading.Thread(target=cls.stub.serve_forever, daemon=True).start()
+        cls.saved_address = (cls.anki.ANKI_CONNECT_HOST, cls.anki.ANKI_CONNECT_PORT)
+        cls.anki.ANKI_CONNECT_HOST, cls.anki.ANKI_CONNECT_PORT = cls.stub.server_address
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.anki.ANKI_CONNECT_HOST, cls.anki.ANKI_CONNECT_PORT = cls.saved_address
+        cls.stub.shutdown()
+        cls.stub.server_close()
+    
+    def setUp(self):
+        self.stub.actions = []
+        self.stub.drop = set()
+        self.stub.close_after = set()
+        # Start from a fresh keep-alive connection, then reuse it
+        conn = getattr(self.anki._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            del self.anki._local.conn
+        self.anki.anki_request("version")
+    
+    def test_lost_write_is_not_resent(self):
+        """Test that a write whose reply is lost is sent once and reported."""
+        self.stub.drop = {"addNotes"}
+        
+        with self.assertRaisesRegex(self.anki.AnkiRequestError, "may have been applied"):
+            self.anki.anki_request("addNotes", {"notes": []})
+        self.assertEqual(self.stub.actions, ["version", "addNotes"])
+    
+    def test_lost_multi_with_write_is_not_resent(self):
+        """Test that a multi containing a write counts as a write."""
+        self.stub.drop = {"multi"}
+        
+        with self.assertRaisesRegex(self.anki.AnkiRequestError, "may have been applied"):
+            self.anki.anki_multi([
+                {"action": "deckNames"},
+                {"action": "addNotes", "params": {"notes": []}},
+            ])
+        self.assertEqual(self.stub.actions, ["version", "multi"])
+    
+    def test_lost_read_is_retried_once(self):
+        """Test that a read-only request is re-sent once, then fails."""
+        self.stub.drop = {"deckNames"}
+        
+        with self.assertRaises(self.anki.AnkiRequestError):
+            self.anki.anki_request("deckNames")
+        self.assertEqual(self.stub.actions, ["version", "deckNames", "deckNames"])
+    
+    def test_write_after_idle_close_uses_new_connection(self):
+        """Test that a connection closed while idle is replaced before a write."""
+        self.stub.close_after = {"version"}
+        self.anki.anki_request("version")
+        time.sleep(0.1)  # let the close reach the client socket
+        
+        self.assertEqual(self.anki.anki_request("addNotes", {"notes": []}), 6)
+        self.assertEqual(self.stub.actions, ["version", "version", "addNotes"])
 
 
 def run_basic_test():
@@ -400,11 +704,10 @@ def run_basic_test():
             "params": {"protocolVersion": "2025-06-18"}
         }
         
-        proc.stdin.write((json.dumps(request) + "\n").encode())
+        proc.stdin.write(_dump(request) + b"\n")
         proc.stdin.flush()
         
-        response_line = proc.stdout.readline().decode().strip()
-        response = json.loads(response_line)
+        response = _load(proc.stdout.readline())
         
         if "result" in response:
             print("✅ Server initialized successfully")